@@ -2,111 +2,283 @@
 """
 E-Consultation Sentiment Analysis App - Cloud Deployment Version
 Optimized for cloud platforms like Render, Railway, Heroku
+Production runs under gunicorn (see Procfile); app.run below is for local development only
 """
 
-import os
-import json
 import csv
+import functools
+import hashlib
+import heapq
+import io
+import json
+import math
+import multiprocessing
+import os
 import re
-from datetime import datetime
+import threading
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Import Flask with error handling
 try:
-    from flask import Flask, request, jsonify
+    from flask import Flask, Response, request, jsonify
     FLASK_AVAILABLE = True
 except ImportError:
     FLASK_AVAILABLE = False
 
+# orjson is optional; result payloads fall back to the json module without it
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Header keywords that identify the free-text column in uploaded CSVs
+TEXT_COLUMN_KEYWORDS = ('comment', 'text', 'feedback', 'suggestion', 'remarks')
+
+# Lexicons are matched against whole lowercased tokens, so each entry lists
+# the plural and inflected forms that should count alongside the base word
+POSITIVE_WORDS = frozenset({
+    'good', 'great', 'excellent', 'positive', 'support', 'agree', 'approve', 
+    'like', 'love', 'amazing', 'wonderful', 'fantastic', 'perfect', 
+    'outstanding', 'brilliant', 'commend', 'endorse', 'recommend', 'beneficial',
+    'effective', 'successful', 'impressive', 'satisfactory', 'adequate',
+    'supports', 'supported', 'supporting', 'supportive', 'supporter', 'supporters',
+    'agrees', 'agreed', 'agreeing', 'agreement', 'approves', 'approved', 'approving',
+    'likes', 'liked', 'liking', 'loves', 'loved', 'loving', 'commends', 'commended',
+    'commendable', 'endorses', 'endorsed', 'endorsing', 'endorsement', 'recommends',
+    'recommended', 'recommending', 'recommendation', 'recommendations',
+    'effectively', 'successfully', 'adequately'
+})
+NEGATIVE_WORDS = frozenset({
+    'bad', 'terrible', 'awful', 'negative', 'oppose', 'disagree', 'disapprove', 
+    'hate', 'dislike', 'horrible', 'disgusting', 'worst', 'fail', 'problem', 
+    'issue', 'concern', 'flawed', 'inadequate', 'insufficient', 'problematic',
+    'disappointing', 'unsatisfactory', 'poor', 'weak', 'deficient',
+    'badly', 'opposes', 'opposed', 'opposing', 'disagrees', 'disagreed', 'disagreeing',
+    'disagreement', 'disapproves', 'disapproved', 'hates', 'hated', 'dislikes',
+    'disliked', 'fails', 'failed', 'failing', 'failure', 'failures', 'problems',
+    'issues', 'concerns', 'concerned', 'poorly', 'weakness', 'weaknesses'
+})
+
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
+    'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
+    'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they'
+})
+
+# A sentence runs up to and including its terminal punctuation, if any
+_SENT_RE = re.compile(r'[^.!?]+[.!?]*')
+_WORD_RE = re.compile(r'\w+')
+
+def _tokenize(text):
+    # Split into sentences once, pairing each with its lowercased word tokens
+    tokenized = []
+    for sentence in _SENT_RE.findall(text):
+        sentence = sentence.strip()
+        if sentence:
+            tokenized.append((sentence, _WORD_RE.findall(sentence.lower())))
+    return tokenized
+
+def _score_difference(difference):
+    if difference > 0:
+        label = 'positive'
+        polarity = min(0.8, 0.3 + difference * 0.1)
+    elif difference < 0:
+        label = 'negative'
+        polarity = max(-0.8, -0.3 + difference * 0.1)
+    else:
+        label = 'neutral'
+        polarity = 0.0
+    
+    confidence = min(1.0, 0.5 + abs(difference) * 0.1)
+    
+    return label, round(confidence, 4), round(polarity, 4)
+
+# Polarity and confidence saturate at this hit difference, so every
+# possible (label, confidence, polarity) result is built once up front
+_MAX_DIFFERENCE = 5
+_SCORES = tuple(_score_difference(d) for d in range(-_MAX_DIFFERENCE, _MAX_DIFFERENCE + 1))
+
+# Lexicon word -> +1 or -1, so each token needs a single lookup to tag its polarity
+_LEXICON = {**dict.fromkeys(POSITIVE_WORDS, 1), **dict.fromkeys(NEGATIVE_WORDS, -1)}
+
+def _score(difference):
+    return _SCORES[max(-_MAX_DIFFERENCE, min(_MAX_DIFFERENCE, difference)) + _MAX_DIFFERENCE]
+
+def _score_tokens(tokens):
+    lexicon_get = _LEXICON.get
+    return _score(sum(lexicon_get(word, 0) for word in tokens))
+
+@functools.lru_cache(maxsize=65536)
+def _analyze_text(text):
+    # Pure function of the text, so repeated comments are only scored once
+    return _score_tokens(_WORD_RE.findall(text.lower()))
+
 class SimpleSentimentAnalyzer:
-    def __init__(self):
-        self.positive_words = [
-            'good', 'great', 'excellent', 'positive', 'support', 'agree', 'approve', 
-            'like', 'love', 'amazing', 'wonderful', 'fantastic', 'perfect', 
-            'outstanding', 'brilliant', 'commend', 'endorse', 'recommend', 'beneficial',
-            'effective', 'successful', 'impressive', 'satisfactory', 'adequate'
-        ]
-        self.negative_words = [
-            'bad', 'terrible', 'awful', 'negative', 'oppose', 'disagree', 'disapprove', 
-            'hate', 'dislike', 'horrible', 'disgusting', 'worst', 'fail', 'problem', 
-            'issue', 'concern', 'flawed', 'inadequate', 'insufficient', 'problematic',
-            'disappointing', 'unsatisfactory', 'poor', 'weak', 'deficient'
-        ]
+    __slots__ = ()
     
-    def analyze_sentiment(self, text):
+    @staticmethod
+    def analyze_sentiment(text):
         if not text:
             return {'label': 'neutral', 'confidence': 0.0, 'polarity': 0.0}
         
-        text_lower = text.lower()
-        positive_count = sum(1 for word in self.positive_words if word in text_lower)
-        negative_count = sum(1 for word in self.negative_words if word in text_lower)
-        
-        if positive_count > negative_count:
-            label = 'positive'
-            polarity = min(0.8, 0.3 + (positive_count - negative_count) * 0.1)
-        elif negative_count > positive_count:
-            label = 'negative'
-            polarity = max(-0.8, -0.3 - (negative_count - positive_count) * 0.1)
-        else:
-            label = 'neutral'
-            polarity = 0.0
-        
-        confidence = min(1.0, 0.5 + abs(positive_count - negative_count) * 0.1)
+        label, confidence, polarity = _analyze_text(text)
         
         return {
             'label': label,
-            'confidence': round(confidence, 4),
-            'polarity': round(polarity, 4)
+            'confidence': confidence,
+            'polarity': polarity
         }
+    
+    @staticmethod
+    def batch_analyze(token_lists):
+        return [_score_tokens(tokens) for tokens in token_lists]
 
 class SimpleTextSummarizer:
-    def __init__(self):
-        self.stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
-            'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
-            'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they'
-        }
+    __slots__ = ()
     
-    def generate_summary(self, text, max_sentences=3):
-        if not text:
-            return "No text provided for summarization."
+    @staticmethod
+    def generate_summary(tokenized_comments, max_sentences=3):
+        # tokenized_comments: any iterable with one list of (sentence, words) pairs per
+        # comment, as produced by _tokenize, consumed in a single pass
+        all_sentences = []
+        sentences = []
+        sentence_terms = []
+        doc_freq = Counter()
+        comment_count = 0
+        for tokenized_sentences in tokenized_comments:
+            comment_count += 1
+            comment_terms = set()
+            for sentence, words in tokenized_sentences:
+                all_sentences.append(sentence)
+                terms = Counter(word for word in words if len(word) > 3 and word not in STOP_WORDS)
+                comment_terms.update(terms)
+                if len(sentence) > 20:
+                    sentences.append(sentence)
+                    sentence_terms.append(terms)
+            doc_freq.update(comment_terms)
         
-        sentences = [s.strip() for s in text.split('.') if len(s.strip()) > 20]
+        if not all_sentences:
+            return "No text provided for summarization."
         if len(sentences) <= max_sentences:
-            return text
-        
-        # Simple extractive summarization
-        word_freq = Counter()
-        for sentence in sentences:
-            words = re.findall(r'\w+', sentence.lower())
-            for word in words:
-                if word not in self.stop_words and len(word) > 3:
-                    word_freq[word] += 1
+            return ' '.join(all_sentences)
         
-        # Score sentences
-        sentence_scores = []
-        for i, sentence in enumerate(sentences):
-            words = re.findall(r'\w+', sentence.lower())
-            score = sum(word_freq.get(word, 0) for word in words if word not in self.stop_words)
-            sentence_scores.append((score, i, sentence))
+        # Extractive summarization with TF-IDF, treating each comment as a document;
+        # smoothed so terms stay weighted even when there is a single comment
+        idf = {term: math.log((1 + comment_count) / (1 + df)) + 1 for term, df in doc_freq.items()}
         
-        # Get top sentences
-        sentence_scores.sort(reverse=True)
-        top_sentences = sorted(sentence_scores[:max_sentences], key=lambda x: x[1])
+        # Score sentences and keep only the top ones, restoring document order
+        sentence_scores = (
+            (sum(tf * idf[term] for term, tf in terms.items()), i, sentence)
+            for i, (sentence, terms) in enumerate(zip(sentences, sentence_terms))
+        )
+        top_sentences = heapq.nlargest(max_sentences, sentence_scores)
+        top_sentences.sort(key=lambda x: x[1])
         
-        return '. '.join([sentence for _, _, sentence in top_sentences]) + '.'
+        return ' '.join([sentence for _, _, sentence in top_sentences])
 
 # Initialize components
 sentiment_analyzer = SimpleSentimentAnalyzer()
 text_summarizer = SimpleTextSummarizer()
 
+def _env_int(name, default):
+    # Optional tuning knobs must not stop the app from booting when malformed
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+# Optional process pool for large uploads. It is off unless ANALYSIS_WORKERS is set:
+# workers pickle every comment's tokens back to the parent, which caps the speedup,
+# so enable it only where it measures faster than the serial path
+ANALYSIS_WORKERS = _env_int('ANALYSIS_WORKERS', 0)
+PARALLEL_MIN_COMMENTS = _env_int('PARALLEL_MIN_COMMENTS', 5000)
+PARALLEL_CHUNK_SIZE = 1000
+
+_analysis_pool = None
+_analysis_pool_lock = threading.Lock()
+
+def _get_analysis_pool():
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is None:
+            # Never fork the threaded gunicorn worker itself; start workers from a clean process
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _analysis_pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS, mp_context=context)
+        return _analysis_pool
+
+def _discard_analysis_pool(pool):
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is pool:
+            _analysis_pool = None
+    pool.shutdown(wait=False)
+
+def _analyze_texts(texts):
+    # Returns (tokenized sentences, sentiment) per text; module-level so worker processes can run it
+    tokenized = [_tokenize(text) for text in texts]
+    sentiments = sentiment_analyzer.batch_analyze(
+        [word for _, words in sentences for word in words] for sentences in tokenized)
+    return list(zip(tokenized, sentiments))
+
+def analyze_texts(texts):
+    if ANALYSIS_WORKERS < 1 or len(texts) < PARALLEL_MIN_COMMENTS:
+        return _analyze_texts(texts)
+    
+    chunks = [texts[i:i + PARALLEL_CHUNK_SIZE] for i in range(0, len(texts), PARALLEL_CHUNK_SIZE)]
+    pool = _get_analysis_pool()
+    try:
+        return [result for chunk in pool.map(_analyze_texts, chunks) for result in chunk]
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); serve this request serially and start
+        # a fresh pool on the next one
+        _discard_analysis_pool(pool)
+        return _analyze_texts(texts)
+
 # Create Flask app
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
-@app.route('/')
-def index():
-    return '''
+def dumps_json(obj):
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+# Result rows are serialized and flushed in batches of this many
+STREAM_BATCH_SIZE = 1000
+
+def _stream_results(comments, analyzed, text_counts, trailer):
+    # Emits {"sentiment_results":[...], **trailer} without building the whole body
+    yield b'{"sentiment_results":['
+    
+    # Everything in a row but its id depends only on the text, so that part is
+    # serialized once and kept for texts that repeat; other rows are built inline
+    repeated_tails = {}
+    
+    def row_tail(text):
+        tail = repeated_tails.get(text)
+        if tail is None:
+            label, confidence, polarity = analyzed[text][1]
+            tail = dumps_json({
+                'text': text if len(text) <= 200 else text[:200] + '...',
+                'sentiment': label,
+                'confidence': confidence,
+                'polarity': polarity
+            })[1:]
+            if text_counts[text] > 1:
+                repeated_tails[text] = tail
+        return tail
+    
+    for start in range(0, len(comments), STREAM_BATCH_SIZE):
+        batch = [b'{"id":' + dumps_json(comment['id']) + b',' + row_tail(comment['text'])
+                 for comment in comments[start:start + STREAM_BATCH_SIZE]]
+        yield (b',' if start else b'') + b','.join(batch)
+    yield b'],' + dumps_json(trailer)[1:]
+
+INDEX_HTML = '''
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -367,6 +539,17 @@ def index():
     </html>
     '''
 
+# The page is static, so encode it and derive its validator once at import
+_INDEX_BODY = INDEX_HTML.encode('utf-8')
+_INDEX_ETAG = hashlib.md5(_INDEX_BODY, usedforsecurity=False).hexdigest()
+
+@app.route('/')
+def index():
+    response = Response(_INDEX_BODY, mimetype='text/html', headers={'Cache-Control': 'public, max-age=3600'})
+    response.set_etag(_INDEX_ETAG)
+    # Answers matching If-None-Match (weak comparison) with a 304
+    return response.make_conditional(request)
+
 @app.route('/upload', methods=['POST'])
 def upload_and_analyze():
     try:
@@ -377,70 +560,72 @@ def upload_and_analyze():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Process CSV directly from memory
-        content = file.read().decode('utf-8')
-        lines = content.strip().split('\n')
+        # Stream CSV rows straight from the upload; before Python 3.11 the
+        # SpooledTemporaryFile Werkzeug spools to lacks readable(), so buffer it
+        stream = file.stream
+        if not hasattr(stream, 'readable'):
+            stream = io.BytesIO(stream.read())
+        reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+        # Blank and whitespace-only lines carry no data, wherever they appear
+        rows = (row for row in reader if any(field.strip() for field in row))
+        header = next(rows, None)
         
-        if len(lines) < 2:
-            return jsonify({'error': 'CSV file must have at least a header and one data row'}), 400
+        # Resolve the text and id columns once from the header
+        text_idx = id_idx = None
+        if header:
+            text_idx = next((i for i, name in enumerate(header)
+                             if any(word in name.lower() for word in TEXT_COLUMN_KEYWORDS)), None)
+            id_idx = next((i for i, name in enumerate(header) if name == 'id'), None)
         
-        # Parse CSV
-        reader = csv.DictReader(lines)
         comments = []
-        
-        for i, row in enumerate(reader, 1):
-            # Find text column
-            text = None
-            for key in row.keys():
-                if any(word in key.lower() for word in ['comment', 'text', 'feedback', 'suggestion', 'remarks']):
-                    text = row[key]
-                    break
+        i = 0
+        for row in rows:
+            i += 1
             
-            if not text and row:
-                text = next((v for v in row.values() if v and len(str(v).strip()) > 10), None)
+            # Without a recognised header, lock onto the column of the first long value seen
+            if text_idx is None:
+                text_idx = next((j for j, v in enumerate(row) if v and len(v.strip()) > 10), None)
             
-            if text and len(str(text).strip()) > 5:
+            text = row[text_idx] if text_idx is not None and text_idx < len(row) else None
+            if text and len(text.strip()) > 5:
                 comments.append({
-                    'id': row.get('id', i),
-                    'text': str(text).strip()
+                    'id': row[id_idx] if id_idx is not None and id_idx < len(row) else i,
+                    'text': text.strip()
                 })
         
+        if not header or not i:
+            return jsonify({'error': 'CSV file must have at least a header and one data row'}), 400
+        
         if not comments:
             return jsonify({'error': 'No valid comments found in CSV file'}), 400
         
         # Analyze sentiments
-        sentiment_results = []
-        for comment in comments:
-            sentiment = sentiment_analyzer.analyze_sentiment(comment['text'])
-            sentiment_results.append({
-                'id': comment['id'],
-                'text': comment['text'][:200] + '...' if len(comment['text']) > 200 else comment['text'],
-                'sentiment': sentiment['label'],
-                'confidence': sentiment['confidence'],
-                'polarity': sentiment['polarity']
-            })
+        # Tokenize and score each distinct comment once, sharing tokens between both analyzers
+        text_counts = Counter(comment['text'] for comment in comments)
+        unique_texts = list(text_counts)
+        analyzed = dict(zip(unique_texts, analyze_texts(unique_texts)))
         
         # Generate summary
-        all_text = ' '.join([comment['text'] for comment in comments])
-        summary = text_summarizer.generate_summary(all_text)
+        summary = text_summarizer.generate_summary(analyzed[comment['text']][0] for comment in comments)
         
         # Calculate distribution
         sentiment_counts = {'positive': 0, 'negative': 0, 'neutral': 0}
         total_polarity = 0
         
-        for result in sentiment_results:
-            sentiment_counts[result['sentiment']] += 1
-            total_polarity += result['polarity']
+        for comment in comments:
+            label, _, polarity = analyzed[comment['text']][1]
+            sentiment_counts[label] += 1
+            total_polarity += polarity
         
-        avg_polarity = total_polarity / len(sentiment_results) if sentiment_results else 0
+        avg_polarity = total_polarity / len(comments)
         
-        return jsonify({
-            'sentiment_results': sentiment_results,
+        # Stream the per-comment rows; everything that can fail has run already
+        return Response(_stream_results(comments, analyzed, text_counts, {
             'summary': summary,
             'sentiment_distribution': sentiment_counts,
             'average_polarity': round(avg_polarity, 4),
-            'total_comments': len(sentiment_results)
-        })
+            'total_comments': len(comments)
+        }), mimetype='application/json')
         
     except Exception as e:
         return jsonify({'error': f'Processing error: {str(e)}'}), 500
@@ -450,5 +635,6 @@ def health_check():
     return jsonify({'status': 'healthy', 'message': 'E-Consultation Sentiment Analysis API is running'})
 
 if __name__ == '__main__':
+    # Werkzeug development server; deployments start gunicorn via the Procfile
     port = int(os.environ.get('PORT', 10000))
     app.run(host='0.0.0.0', port=port, debug=False, threaded=True)